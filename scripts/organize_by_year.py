@@ -21,11 +21,17 @@ the extension (e.g., '2022-photo-01.jpg') to prevent overwriting.
 The --dry-run flag can be used to print the intended file moves without
 actually executing them.
 """
+import errno
 import os
 import re
 import shutil
 import argparse
 
+# Matches files starting with any four-digit year.
+_YEAR_PREFIX_RE = re.compile(r'(\d{4})')
+# Matches a four-digit year on its own.
+_YEAR_RE = re.compile(r'\d{4}')
+
 def organize_files_by_year(source_year, dry_run=False):
     """
     Scans a source year directory and moves files that are prefixed with a
@@ -40,12 +46,10 @@ def organize_files_by_year(source_year, dry_run=False):
         print(f"Error: Source directory '{source_year}' does not exist.")
         return
 
-    # Regex to find files starting with any four-digit year.
-    prefix_pattern = re.compile(r'^(\d{4})')
-
     # Get a list of all files in the source directory.
     try:
-        files_in_source_dir = [f for f in os.listdir(source_year) if os.path.isfile(os.path.join(source_year, f))]
+        with os.scandir(source_year) as entries:
+            files_in_source_dir = [e.name for e in entries if e.is_file()]
     except OSError as e:
         print(f"Error reading directory '{source_year}': {e}")
         return
@@ -56,8 +60,12 @@ def organize_files_by_year(source_year, dry_run=False):
 
     print(f"Scanning {len(files_in_source_dir)} files in '{source_year}'...")
 
+    # Names in each destination directory, listed once on first use so that
+    # collisions can be checked without a stat() per candidate name.
+    dest_files = {}
+
     for filename in files_in_source_dir:
-        match = prefix_pattern.match(filename)
+        match = _YEAR_PREFIX_RE.match(filename)
 
         # Skip files that don't have a 4-digit prefix.
         if not match:
@@ -78,28 +86,42 @@ def organize_files_by_year(source_year, dry_run=False):
             print(f"Warning: Destination directory '{destination_year}' for file '{filename}' does not exist. Skipping.")
             continue
 
-        destination_path = os.path.join(destination_year, filename)
+        if destination_year not in dest_files:
+            try:
+                dest_files[destination_year] = set(os.listdir(destination_year))
+            except OSError as e:
+                print(f"Error reading directory '{destination_year}': {e}")
+                continue
+        existing_files = dest_files[destination_year]
 
         # Handle potential filename collisions in the destination.
-        if os.path.exists(destination_path):
+        new_filename = filename
+        if new_filename in existing_files:
             base, extension = os.path.splitext(filename)
             counter = 1
             while True:
                 new_filename = f"{base}-{counter:02d}{extension}"
-                new_destination_path = os.path.join(destination_year, new_filename)
-                if not os.path.exists(new_destination_path):
-                    destination_path = new_destination_path
+                if new_filename not in existing_files:
                     break
                 counter += 1
-        
+        destination_path = os.path.join(destination_year, new_filename)
+        existing_files.add(new_filename)
+
         # Move the file or print the action for a dry run.
         if dry_run:
             print(f"[DRY RUN] Would move: '{source_path}' -> '{destination_path}'")
         else:
             try:
-                shutil.move(source_path, destination_path)
+                # The year directories are siblings, so a plain rename
+                # normally suffices; shutil.move handles other filesystems.
+                try:
+                    os.rename(source_path, destination_path)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.move(source_path, destination_path)
                 print(f"Moved: '{source_path}' -> '{destination_path}'")
-            except shutil.Error as e:
+            except (OSError, shutil.Error) as e:
                 print(f"Error moving file '{filename}': {e}")
 
     print("\nOrganization complete.")
@@ -121,7 +143,7 @@ if __name__ == "__main__":
     )
     args = parser.parse_args()
 
-    if not re.match(r'^\d{4}$', args.year):
+    if not _YEAR_RE.fullmatch(args.year):
         print("Error: Please provide a valid four-digit year.")
         parser.print_help()
         exit(1)
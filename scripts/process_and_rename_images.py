@@ -15,7 +15,10 @@ It performs the following steps:
 
 2.  **Finds Timestamps:** For each file, it tries to find the creation date and
     time from two sources, in order of preference:
-    a.  It uses the `exiftool` utility to read metadata tags.
+    a.  It uses the `exiftool` utility to read metadata tags. A single
+        exiftool process is kept open (`-stay_open`) and fed files in batches,
+        rather than launching exiftool once per file. Files are split across
+        several such processes (see `--jobs`) to use all CPU cores.
         - For images, it looks for `DateTimeOriginal`.
         - For videos, it checks `CreateDate`, `MediaCreateDate`, and
           `TrackCreateDate`.
@@ -47,145 +50,332 @@ import os
 import subprocess
 import sys
 import re
+import shlex
 import json
 import argparse
-from datetime import datetime
-from collections import defaultdict
+import functools
+import itertools
+import threading
+import time
+from collections import Counter, defaultdict
+from multiprocessing import Pool
+
+# orjson parses JSON several times faster than the standard library; it is
+# optional and the json module is used when it is not installed.
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Matches a Google Photos duplicate suffix, e.g. 'IMG_0001(1).jpg'.
+_PAREN_NUM_RE = re.compile(r'(.*)(\([0-9]+\))(\.[a-zA-Z]*)')
+# Matches an exiftool date value, e.g. '2020:01:02 03:04:05'.
+_EXIF_DT_RE = re.compile(r'\d{4}:\d{2}:\d{2} \d{2}:\d{2}:\d{2}')
+
+# Number of files sent to exiftool per `-execute` in a stay_open session.
+EXIFTOOL_BATCH_SIZE = 256
+
+# Number of generated script lines buffered before writing them out.
+WRITE_CHUNK_LINES = 10000
+
+# Formats one line of the generated script; arguments must be shell-quoted.
+MV_COMMAND = 'mv {} {}\n'.format
+
+IMAGE_EXIF_TAGS = ['DateTimeOriginal']
+VIDEO_EXIF_TAGS = ['DateTimeOriginal', 'CreateDate', 'MediaCreateDate', 'TrackCreateDate']
+
+def comment_line(text):
+    """
+    Formats `text` as a comment in the generated script. A newline in `text`
+    (e.g. from a file name) continues the comment instead of starting a command.
+    """
+    return '# ' + text.replace('\n', '\n# ') + '\n'
 
-def get_exif_datetime(filepath):
-    """Runs exiftool on an image file and returns the DateTimeOriginal tag."""
+def start_exiftool():
+    """
+    Starts a single long-running exiftool process which reads its arguments
+    from stdin, so that exiftool's startup cost is paid only once.
+    """
     try:
-        result = subprocess.run(
-            ['exiftool', '-T', '-DateTimeOriginal', filepath],
-            capture_output=True, text=True, check=False
+        return subprocess.Popen(
+            ['exiftool', '-stay_open', 'True', '-@', '-'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8', errors='surrogateescape'
         )
-        if result.returncode != 0 or not result.stdout.strip() or result.stdout.strip() == '-':
-            return None
-        return result.stdout.strip()
-    except (FileNotFoundError):
+    except FileNotFoundError:
         print("Error: exiftool not found. Please install it to read EXIF data.", file=sys.stderr)
         sys.exit(1)
-    except Exception as e:
-        print(f"Error running exiftool on {filepath}: {e}", file=sys.stderr)
-        return None
 
-def get_video_exif_datetime(filepath):
+def stop_exiftool(proc):
+    """Tells a stay_open exiftool process to exit and waits for it."""
+    try:
+        proc.stdin.write('-stay_open\nFalse\n')
+        proc.stdin.close()
+    except OSError:
+        pass
+    proc.wait()
+
+def exiftool_arg(arg):
+    """
+    Formats `arg` as one line of an exiftool argument file. exiftool reads one
+    argument per line, so an argument holding a line break is written in its
+    escaped '#[CSTR]' form rather than being split into several arguments.
     """
-    Runs exiftool on a video file and returns the creation date from the first
-    available tag in order of preference.
+    if '\n' not in arg and '\r' not in arg:
+        return arg
+    escaped = (arg.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r'))
+    return f'#[CSTR]{escaped}'
+
+def send_exif_batch(proc, filepaths, tags):
+    """Queues a request for `tags` of `filepaths` in a stay_open exiftool session."""
+    args = ['-j', *(f'-{tag}' for tag in tags), *map(exiftool_arg, filepaths), '-execute']
+    proc.stdin.write('\n'.join(args) + '\n')
+    proc.stdin.flush()
+
+def read_exif_batch(proc):
     """
+    Reads the reply to the oldest queued request of a stay_open exiftool
+    session. Returns a dict mapping each file path to the dict of tags
+    exiftool found.
+    """
+    lines = []
+    for line in proc.stdout:
+        if line.rstrip() == '{ready}':
+            break
+        lines.append(line)
+
+    output = ''.join(lines).strip()
+    if not output:
+        return {}
     try:
-        cmd = ['exiftool', '-G', '-s', '-DateTimeOriginal', '-CreateDate', '-MediaCreateDate', '-TrackCreateDate', filepath]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        return {entry['SourceFile']: entry for entry in json_loads(output)}
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"Could not parse exiftool output: {e}", file=sys.stderr)
+        return {}
 
-        if result.returncode != 0:
-            return None
+def batch_exif(proc, filepaths, tags):
+    """
+    Reads `tags` for a batch of files through a stay_open exiftool session.
+    Returns a dict mapping each file path to the dict of tags exiftool found.
+    """
+    send_exif_batch(proc, filepaths, tags)
+    return read_exif_batch(proc)
 
-        found_tags = {}
-        for line in result.stdout.strip().splitlines():
-            match = re.match(r'\\[\\w\\d_\\]+\\\s+([\\w\\d_]+)\s+:\s+(.*)', line)
-            if match:
-                tag_name, tag_value = match.groups()
-                if re.match(r'\\d{4}:\\d{2}:\\d{2} \\d{2}:\\d{2}:\\d{2}', tag_value.strip()):
-                    found_tags[tag_name] = tag_value.strip()
+def send_exif_batches(proc, batches, tags, errors):
+    """
+    Queues every batch in `batches`. If queuing fails, exiftool is killed so
+    that the reader is not left waiting for replies, and the exception is
+    appended to `errors` for the reading thread to raise.
+    """
+    try:
+        for batch in batches:
+            send_exif_batch(proc, batch, tags)
+    except BaseException as e:
+        proc.kill()
+        errors.append(e)
 
-        preference = ['DateTimeOriginal', 'CreateDate', 'MediaCreateDate', 'TrackCreateDate']
-        for tag in preference:
-            if tag in found_tags:
-                return found_tags[tag]
+def get_exif_datetime(exif_tags, preference):
+    """
+    Returns the first valid 'YYYY:MM:DD HH:MM:SS' value among the tags in
+    `preference`, or None if no tag holds a usable date.
+    """
+    for tag in preference:
+        value = str(exif_tags.get(tag, '')).strip()
+        if _EXIF_DT_RE.match(value):
+            return value[:19]
+    return None
 
-        return None
-    except FileNotFoundError:
-        print("Error: exiftool not found. Please install it to read EXIF data.", file=sys.stderr)
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error running exiftool on {filepath}: {e}", file=sys.stderr)
-        return None
+@functools.lru_cache(maxsize=4096)
+def dir_entries(dirpath):
+    """Returns the set of names in `dirpath`, listing each directory only once."""
+    try:
+        return frozenset(os.listdir(dirpath or '.'))
+    except OSError:
+        return frozenset()
+
+@functools.lru_cache(maxsize=4096)
+def json_stems_by_length(dirpath, suffix):
+    """
+    Groups the names in `dirpath` that end with `suffix` by the length of the
+    part before the suffix. Returns (length, stems) pairs, longest first.
+    """
+    stems = defaultdict(set)
+    for name in dir_entries(dirpath):
+        if name.endswith(suffix):
+            stem = name[:-len(suffix)]
+            stems[len(stem)].add(stem)
+    return tuple(sorted(stems.items(), reverse=True))
 
 def find_json_file(image_path):
     """Finds the JSON file associated with a media file, trying different truncations."""
     num = None
     metadata_name = f"{image_path}.supplemental-metadata"
-    match = re.match(r'(.*)(\([0-9]+\))(\.[a-zA-Z]*)', image_path)
+    match = _PAREN_NUM_RE.match(image_path)
     if match:
         filename, num, ext = match.groups()
         metadata_name = f'{filename}{ext}.supplemental-metadata'
-    for i in range(len(metadata_name), 10, -1):
-        substring = metadata_name[:i]
-        potential_json_path = f"{substring}{num}.json" if num else f"{substring}.json"
-        if os.path.exists(potential_json_path):
-            return potential_json_path
+
+    # Only the truncation lengths that actually occur among the JSON files in
+    # the containing directory are tried, longest first.
+    dirpath = os.path.dirname(image_path)
+    metadata_base = os.path.basename(metadata_name)
+    min_length = max(0, 10 - (len(metadata_name) - len(metadata_base)))
+    suffix = f"{num}.json" if num else ".json"
+
+    # Most sidecars are not truncated; the full name is also the longest
+    # possible match, so it can be checked first without the index.
+    if f"{metadata_base}{suffix}" in dir_entries(dirpath):
+        return os.path.join(dirpath, f"{metadata_base}{suffix}")
+
+    for length, stems in json_stems_by_length(dirpath, suffix):
+        if length <= min_length:
+            break
+        if length <= len(metadata_base) and metadata_base[:length] in stems:
+            return os.path.join(dirpath, f"{metadata_base[:length]}{suffix}")
     return None
 
 def get_json_datetime(json_filepath):
     """Extracts and formats the timestamp from a JSON file."""
     try:
-        with open(json_filepath, 'r') as f:
-            data = json.load(f)
+        with open(json_filepath, 'rb') as f:
+            data = json_loads(f.read())
             timestamp_str = data.get('photoTakenTime', {}).get('timestamp')
             if timestamp_str:
-                dt_object = datetime.fromtimestamp(int(timestamp_str))
-                return dt_object.strftime('%Y%m%d-%H%M%S')
+                return format_timestamp(int(timestamp_str))
     except (json.JSONDecodeError, KeyError, ValueError) as e:
         print(f"Could not process JSON file {json_filepath}: {e}", file=sys.stderr)
     return None
 
+def format_timestamp(timestamp):
+    """Formats a Unix timestamp as 'YYYYMMDD-HHMMSS' in local time."""
+    lt = time.localtime(timestamp)
+    return (f"{lt.tm_year:04d}{lt.tm_mon:02d}{lt.tm_mday:02d}-"
+            f"{lt.tm_hour:02d}{lt.tm_min:02d}{lt.tm_sec:02d}")
+
 def format_exif_datetime(dt_string):
     """Formats 'YYYY:MM:DD HH:MM:SS' to 'YYYYMMDD-HHMMSS'."""
     if not dt_string:
         return None
-    return dt_string.replace(':', '').replace(' ', '-', 1)
-
-def process(directory, is_video=False):
-  with open('ALL_YEARS.sh', 'a') as f_out:
-    timestamp_counts = defaultdict(int)
-    
+    s = dt_string
+    return f"{s[0:4]}{s[5:7]}{s[8:10]}-{s[11:13]}{s[14:16]}{s[17:19]}"
+
+def find_media_files(directory, file_extensions):
+    """Recursively yields the files in `directory` with one of `file_extensions`."""
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # DirEntry caches the file type, so this needs no stat().
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(file_extensions):
+                        yield entry.path
+        except OSError:
+            continue
+
+def scan_timestamps(filepaths, exif_tags):
+    """
+    Finds the timestamp and JSON file for each of `filepaths` using its own
+    stay_open exiftool session. Returns a list of (timestamp, json_path)
+    tuples in the same order as `filepaths`, both None if no timestamp was
+    found. `filepaths` should be grouped by directory; batches never span
+    directories.
+    """
+    results = []
+    batches = []
+    for _, dir_files in itertools.groupby(filepaths, key=os.path.dirname):
+        dir_files = list(dir_files)
+        batches.extend(dir_files[i:i + EXIFTOOL_BATCH_SIZE]
+                       for i in range(0, len(dir_files), EXIFTOOL_BATCH_SIZE))
+    exiftool = start_exiftool()
+
+    # All batches are queued from a separate thread, so exiftool keeps working
+    # on the next batch while this one reads JSON files for the current one.
+    feeder_errors = []
+    feeder = threading.Thread(target=send_exif_batches,
+                              args=(exiftool, batches, exif_tags, feeder_errors))
+    feeder.start()
+    try:
+        for batch in batches:
+            exif_data = read_exif_batch(exiftool)
+            for filepath in batch:
+                timestamp = format_exif_datetime(
+                    get_exif_datetime(exif_data.get(filepath, {}), exif_tags))
+
+                json_path = find_json_file(filepath)
+                if not timestamp and json_path:
+                    timestamp = get_json_datetime(json_path)
+
+                if timestamp:
+                    results.append((timestamp, json_path))
+                else:
+                    results.append((None, None))
+        feeder.join()
+        if feeder_errors:
+            raise feeder_errors[0]
+    except BaseException:
+        # Unblock the feeder, which may be waiting on a full pipe.
+        exiftool.kill()
+        raise
+    finally:
+        feeder.join()
+        stop_exiftool(exiftool)
+    return results
+
+def process(directory, is_video=False, jobs=1):
+  with open('ALL_YEARS.sh', 'a', errors='surrogateescape') as f_out:
     if is_video:
         file_extensions = ('.avi', '.mp4', '.mov')
-        exif_func = get_video_exif_datetime
+        exif_tags = VIDEO_EXIF_TAGS
         media_type = "videos"
     else:
         file_extensions = ('.jpg', '.jpeg')
-        exif_func = get_exif_datetime
+        exif_tags = IMAGE_EXIF_TAGS
         media_type = "images"
 
-    all_files = []
-    for root, _, files in os.walk(directory):
-        for filename in files:
-            if filename.lower().endswith(file_extensions):
-                all_files.append(os.path.join(root, filename))
+    sorted_files = sorted(find_media_files(directory, file_extensions))
 
-    potential_renames = {}
-    total = len(all_files)
+    total = len(sorted_files)
     if total == 0:
         print(f"No {media_type} found in {directory}")
         return
         
     block = total // 10 if total > 10 else total
-    print(f'{len(all_files)} {media_type} to process in {directory}')
-    for filepath in sorted(all_files):
-        timestamp = None
-        exif_dt = exif_func(filepath)
-        if exif_dt:
-            timestamp = format_exif_datetime(exif_dt)
-        
-        json_path = find_json_file(filepath)
-        if not timestamp and json_path:
-            timestamp = get_json_datetime(json_path)
-
-        if timestamp:
-            potential_renames[filepath] = (timestamp, json_path)
-            timestamp_counts[timestamp] += 1
-        else:
-            potential_renames[filepath] = (None, None)
+    print(f'{total} {media_type} to process in {directory}')
+    # Scan the files one directory at a time, so that each exiftool batch and
+    # each cached directory listing covers a single directory. Each worker
+    # runs its own exiftool session over a contiguous range of directories.
+    scan_order = sorted(range(total), key=lambda i: os.path.dirname(sorted_files[i]))
+    scan_files = [sorted_files[i] for i in scan_order]
+    jobs = max(1, min(jobs, total))
+    if jobs == 1:
+        scan_results = scan_timestamps(scan_files, exif_tags)
+    else:
+        bounds = [total * i // jobs for i in range(jobs + 1)]
+        shards = [(scan_files[start:end], exif_tags) for start, end in zip(bounds, bounds[1:])]
+        with Pool(jobs) as pool:
+            scan_results = list(itertools.chain.from_iterable(
+                pool.starmap(scan_timestamps, shards)))
+    del scan_files
+
+    # Put the results back into sorted order for numbering and output.
+    potential_renames = [None] * total
+    for i, result in zip(scan_order, scan_results):
+        potential_renames[i] = result
+    del scan_order, scan_results
+
+    # Only the number of files per timestamp is needed to decide on suffixes.
+    timestamp_counts = Counter(timestamp for timestamp, _ in potential_renames if timestamp)
 
     processed_timestamps = defaultdict(int)
     done = 0
-    for filepath in sorted(all_files):
-        timestamp, json_path = potential_renames.get(filepath, (None, None))
+    lines = []
+    for filepath, (timestamp, json_path) in zip(sorted_files, potential_renames):
         done += 1
         if block > 0 and done % block == 0:
-            print(f'  {done:04}/{len(all_files):04} done', flush=True)
+            print(f'  {done:04}/{total:04} done', flush=True)
         if timestamp:
             base_new_name = timestamp
             current_count = processed_timestamps[base_new_name]
@@ -195,21 +385,30 @@ def process(directory, is_video=False):
             if timestamp_counts[base_new_name] > 1:
                 suffix = f"-{current_count:02d}"
 
+            # Computed once per file and shared by the image and JSON commands.
             extension = os.path.splitext(filepath)[1]
+            done_dir = os.path.join('done', os.path.dirname(filepath))
             new_filename = f"{base_new_name}{suffix}{extension}"
-            new_filepath = os.path.join('done', os.path.dirname(filepath), new_filename)
+            new_filepath = os.path.join(done_dir, new_filename)
 
-            f_out.write(f'mv "{filepath}" "{new_filepath}"\n')
+            lines.append(MV_COMMAND(shlex.quote(filepath), shlex.quote(new_filepath)))
 
             if json_path:
                 new_json_filename = f"{base_new_name}{suffix}.json"
-                new_json_filepath = os.path.join('done', os.path.dirname(filepath), new_json_filename)
-                f_out.write(f'mv "{json_path}" "{new_json_filepath}"\n')
+                new_json_filepath = os.path.join(done_dir, new_json_filename)
+                lines.append(MV_COMMAND(shlex.quote(json_path), shlex.quote(new_json_filepath)))
             else:
-                f_out.write(f'# No json file for {filepath}\n')
+                lines.append(comment_line(f'No json file for {shlex.quote(filepath)}'))
         else:
-            f_out.write(f'# No timestamp information available for {filepath}\n')
+            lines.append(comment_line(
+                f'No timestamp information available for {shlex.quote(filepath)}'))
+
+        # Write the commands in large chunks rather than line by line.
+        if len(lines) >= WRITE_CHUNK_LINES:
+            f_out.write(''.join(lines))
+            lines.clear()
 
+    f_out.write(''.join(lines))
     print(f'Done')
 
 def main():
@@ -224,6 +423,13 @@ def main():
         action='store_true',
         help='Process video files (.avi, .mp4, .mov) instead of images.'
     )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=os.cpu_count() or 1,
+        help='Number of parallel exiftool processes (default: number of CPUs). '
+             'Use a lower value (e.g. 4) on spinning disks.'
+    )
     args = parser.parse_args()
 
     if not os.path.isdir(args.directory):
@@ -237,7 +443,7 @@ def main():
         print("Please install it to use this script (e.g., 'sudo apt-get install libimage-exiftool-perl')", file=sys.stderr)
         sys.exit(1)
 
-    process(args.directory, is_video=args.videos)
+    process(args.directory, is_video=args.videos, jobs=args.jobs)
 
 if __name__ == "__main__":
     main()
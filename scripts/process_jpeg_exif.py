@@ -13,33 +13,52 @@ It performs the following main functions:
 
 3.  **EXIF Data Handling:** It uses the external command-line utility `exiftool`
     to interact with the image's metadata. It first reads the existing
-    `DateTimeOriginal` tag.
+    `DateTimeOriginal` tag of all files through a single long-running
+    exiftool process.
     - If an EXIF timestamp exists, it compares it with the filename's
       timestamp. If they differ by more than one second, it prints a
       "Timestamp mismatch" warning.
     - If no EXIF timestamp exists, it sets the `DateTimeOriginal` tag in the
       file using the timestamp parsed from the filename, modifying the file
-      directly.
+      directly. All such writes are done by one exiftool run at the end.
+
+The --assume-missing flag skips reading the existing EXIF timestamps and sets
+`DateTimeOriginal` from the filename on every file, which is faster for
+freshly imported images known to have no EXIF date.
 """
 import os
 import re
+import json
 import subprocess
 import argparse
+import tempfile
 from datetime import datetime, timedelta
 from tqdm import tqdm
 
+# Number of files whose EXIF data is read per exiftool request.
+EXIFTOOL_BATCH_SIZE = 256
+
+# Matches a YYYYMMDD-HHMMSS timestamp anywhere in a filename.
+_FNAME_DT_RE = re.compile(r'(\d{8})-(\d{6})')
+
 def find_jpeg_files(directory):
-    """Recursively finds all JPEG files in a directory."""
-    jpeg_files = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.lower().endswith(('.jpg', '.jpeg')):
-                jpeg_files.append(os.path.join(root, file))
-    return jpeg_files
+    """Recursively finds all JPEG files in a directory, yielding them lazily."""
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # DirEntry caches the file type, so this needs no stat().
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file() and entry.name.lower().endswith(('.jpg', '.jpeg')):
+                        yield entry.path
+        except OSError:
+            continue
 
 def parse_datetime_from_filename(filename):
     """Parses YYYYMMDD-HHMMSS from the filename."""
-    match = re.search(r'(\d{8})-(\d{6})', os.path.basename(filename))
+    match = _FNAME_DT_RE.search(os.path.basename(filename))
     if match:
         try:
             return datetime.strptime(f"{match.group(1)}{match.group(2)}", '%Y%m%d%H%M%S')
@@ -47,61 +66,169 @@ def parse_datetime_from_filename(filename):
             return None
     return None
 
-def get_exif_datetime(filepath):
-    """Gets the DateTimeOriginal from a file using exiftool."""
+def parse_exif_datetime(exif_tags):
+    """Parses the DateTimeOriginal tag returned by exiftool, if present."""
     try:
-        cmd = ['exiftool', '-s', '-s', '-s', '-DateTimeOriginal', filepath]
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        if result.stdout.strip():
-            return datetime.strptime(result.stdout.strip(), '%Y:%m:%d %H:%M:%S')
-    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        return datetime.strptime(str(exif_tags['DateTimeOriginal']).strip()[:19], '%Y:%m:%d %H:%M:%S')
+    except (KeyError, ValueError):
         return None
-    return None
 
-def set_exif_datetime(filepath, dt_object):
-    """Sets the DateTimeOriginal in a file using exiftool."""
+def start_exiftool():
+    """
+    Starts a single long-running exiftool process which reads its arguments
+    from stdin, so that exiftool's startup cost is paid only once.
+    """
+    return subprocess.Popen(
+        ['exiftool', '-stay_open', 'True', '-@', '-'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        text=True, encoding='utf-8', errors='surrogateescape'
+    )
+
+def stop_exiftool(proc):
+    """Tells a stay_open exiftool process to exit and waits for it."""
+    try:
+        proc.stdin.write('-stay_open\nFalse\n')
+        proc.stdin.close()
+    except OSError:
+        pass
+    proc.wait()
+
+def exiftool_arg(arg):
+    """
+    Formats `arg` as one line of an exiftool argument file. exiftool reads one
+    argument per line, so an argument holding a line break is written in its
+    escaped '#[CSTR]' form rather than being split into several arguments.
+    """
+    if '\n' not in arg and '\r' not in arg:
+        return arg
+    escaped = (arg.replace('\\', '\\\\').replace('"', '\\"')
+               .replace('\n', '\\n').replace('\r', '\\r'))
+    return f'#[CSTR]{escaped}'
+
+def batch_exif(proc, filepaths, tags):
+    """
+    Reads `tags` for a batch of files through a stay_open exiftool session.
+    Returns a dict mapping each file path to the dict of tags exiftool found.
+    """
+    args = ['-j', *(f'-{tag}' for tag in tags), *map(exiftool_arg, filepaths), '-execute']
+    proc.stdin.write('\n'.join(args) + '\n')
+    proc.stdin.flush()
+
+    lines = []
+    for line in proc.stdout:
+        if line.rstrip() == '{ready}':
+            break
+        lines.append(line)
+
+    output = ''.join(lines).strip()
+    if not output:
+        return {}
+    try:
+        return {entry['SourceFile']: entry for entry in json.loads(output)}
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"Could not parse exiftool output: {e}")
+        return {}
+
+def queue_exif_write(args_f, filepath, dt_object):
+    """Appends the exiftool arguments that set DateTimeOriginal on `filepath` to `args_f`."""
     dt_str = dt_object.strftime('%Y:%m:%d %H:%M:%S')
+    # -execute runs each file as its own command so every file gets its own value.
+    args_f.write(f'-DateTimeOriginal={dt_str}\n-overwrite_original\n'
+                 f'{exiftool_arg(filepath)}\n-execute\n')
+
+def set_exif_datetimes(args_path):
+    """
+    Applies every write queued in the argument file at `args_path` with a
+    single exiftool invocation.
+    Returns True if exiftool reported success.
+    """
     try:
-        cmd = ['exiftool', f'-DateTimeOriginal="{dt_str}"', '-overwrite_original', filepath]
-        subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
+        result = subprocess.run(['exiftool', '-@', args_path], capture_output=True, text=True)
+        for line in result.stderr.splitlines():
+            print(line)
+        return result.returncode == 0
+    except FileNotFoundError:
         return False
 
-def process_images(directory):
-    """Processes all JPEG images in a directory."""
+def check_batch(exiftool, batch):
+    """
+    Compares filename and EXIF timestamps for a batch of (filepath, datetime)
+    pairs. Returns the pairs of files without an EXIF timestamp, to be set.
+    """
+    missing = []
+    exif_data = batch_exif(exiftool, [filepath for filepath, _ in batch], ['DateTimeOriginal'])
+    for filepath, filename_dt in batch:
+        exif_dt = parse_exif_datetime(exif_data.get(filepath, {}))
+
+        if exif_dt:
+            # Check for difference
+            if abs((filename_dt - exif_dt).total_seconds()) > 1:
+                tqdm.write(f"Timestamp mismatch for {os.path.basename(filepath)}: "
+                           f"Filename: {filename_dt}, EXIF: {exif_dt}")
+        else:
+            # Queue the datetime to be set
+            tqdm.write(f"Setting EXIF datetime for {os.path.basename(filepath)} to {filename_dt}")
+            missing.append((filepath, filename_dt))
+    return missing
+
+def process_images(directory, assume_missing=False):
+    """
+    Processes all JPEG images in a directory. With `assume_missing`, existing
+    EXIF timestamps are not read and every file is set from its filename.
+    """
     print(f"Scanning for JPEG files in '{directory}'...")
-    jpeg_files = find_jpeg_files(directory)
-    if not jpeg_files:
+    total_files = 0
+    batch = []
+    pending_writes = 0
+
+    # Writes are appended to an exiftool argument file as they are queued, so
+    # they are not held in memory, and are still applied if the scan is
+    # interrupted after they were reported.
+    args_f = tempfile.NamedTemporaryFile('w', suffix='.args', encoding='utf-8',
+                                         errors='surrogateescape', delete=False)
+    exiftool = None if assume_missing else start_exiftool()
+    try:
+        # Files are processed as they are found, so the total is not known upfront.
+        with tqdm(find_jpeg_files(directory), unit='file') as pbar:
+            for filepath in pbar:
+                total_files += 1
+                filename_dt = parse_datetime_from_filename(filepath)
+                if not filename_dt:
+                    tqdm.write(f"Could not parse datetime from filename: {os.path.basename(filepath)}")
+                    continue
+
+                if assume_missing:
+                    queue_exif_write(args_f, filepath, filename_dt)
+                    pending_writes += 1
+                    continue
+
+                batch.append((filepath, filename_dt))
+                if len(batch) >= EXIFTOOL_BATCH_SIZE:
+                    for missing_filepath, missing_dt in check_batch(exiftool, batch):
+                        queue_exif_write(args_f, missing_filepath, missing_dt)
+                        pending_writes += 1
+                    batch = []
+
+            if batch:
+                for missing_filepath, missing_dt in check_batch(exiftool, batch):
+                    queue_exif_write(args_f, missing_filepath, missing_dt)
+                    pending_writes += 1
+    finally:
+        if exiftool:
+            stop_exiftool(exiftool)
+        args_f.close()
+        try:
+            if pending_writes:
+                print(f"Writing EXIF datetime to {pending_writes} files...")
+                if not set_exif_datetimes(args_f.name):
+                    print("Failed to set EXIF for some files, see the messages above.")
+        finally:
+            os.remove(args_f.name)
+
+    if not total_files:
         print("No JPEG files found.")
         return
 
-    total_files = len(jpeg_files)
-    print(f"Found {total_files} JPEG files. Starting processing...")
-
-    with tqdm(total=total_files, unit='file') as pbar:
-        for filepath in jpeg_files:
-            filename_dt = parse_datetime_from_filename(filepath)
-            if not filename_dt:
-                tqdm.write(f"Could not parse datetime from filename: {os.path.basename(filepath)}")
-                pbar.update(1)
-                continue
-
-            exif_dt = get_exif_datetime(filepath)
-
-            if exif_dt:
-                # Check for difference
-                if abs((filename_dt - exif_dt).total_seconds()) > 1:
-                    tqdm.write(f"Timestamp mismatch for {os.path.basename(filepath)}: "
-                               f"Filename: {filename_dt}, EXIF: {exif_dt}")
-            else:
-                # Set the datetime
-                tqdm.write(f"Setting EXIF datetime for {os.path.basename(filepath)} to {filename_dt}")
-                if not set_exif_datetime(filepath, filename_dt):
-                    tqdm.write(f"Failed to set EXIF for {os.path.basename(filepath)}")
-            
-            pbar.update(1)
-
     print("\nProcessing complete.")
 
 if __name__ == '__main__':
@@ -115,6 +242,12 @@ if __name__ == '__main__':
         type=str, 
         help='The directory to process recursively.'
     )
+    parser.add_argument(
+        '--assume-missing',
+        action='store_true',
+        help='Skip reading existing EXIF timestamps and set DateTimeOriginal from the '
+             'filename on every file, overwriting any existing value.'
+    )
     args = parser.parse_args()
 
     if not os.path.isdir(args.directory):
@@ -128,4 +261,4 @@ if __name__ == '__main__':
         print("Please install it to use this script (e.g., 'sudo apt-get install libimage-exiftool-perl')")
         exit(1)
 
-    process_images(args.directory)
\ No newline at end of file
+    process_images(args.directory, args.assume_missing)
\ No newline at end of file
@@ -3,14 +3,31 @@
 import os
 import sys
 import argparse
+import functools
+import io
 import shutil
 import subprocess
-import tempfile
-from PIL import Image, ImageSequence, ExifTags
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, cpu_count
+import PIL
+from PIL import Image, ImageSequence, ExifTags, JpegImagePlugin, PngImagePlugin
 from tqdm import tqdm
 
 # Define the maximum size for the resized images
 MAX_SIZE = (1080, 1080)
+# Supported image extensions and the Pillow format each is expected to hold
+EXTENSION_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.png': 'PNG', '.gif': 'GIF'}
+# PNG modes that Pillow can re-save without loss, when stored at 8 bits per sample
+PNG_OPTIMIZE_MODES = frozenset({'L', 'LA', 'P', 'RGB', 'RGBA'})
+# PNG chunks that Pillow writes back unchanged; any other chunk (e.g. gAMA, sRGB,
+# pHYs or eXIf) would be dropped, so PNGs holding one are copied instead
+PNG_OPTIMIZE_CHUNKS = frozenset({b'IHDR', b'PLTE', b'tRNS', b'IDAT', b'IEND',
+                                 b'tEXt', b'zTXt', b'iTXt'})
+# JPEG quality used for resized images, unless the source's quality is lower
+JPEG_QUALITY = 85
 
 def human_readable_size(size, decimal_places=2):
     """Formats bytes into a human-readable string (KB, MB, GB)."""
@@ -24,32 +41,67 @@ def is_tool_installed(name):
     """Check whether `name` is on PATH and marked as executable."""
     return shutil.which(name) is not None
 
-def resize_image(source_path, output_path, use_gifsicle=False):
+def is_pillow_simd():
+    """Check whether PIL is provided by Pillow-SIMD, whose versions end in '.postN'."""
+    return '.post' in PIL.__version__
+
+def _fadvise(fd, advice):
+    """Gives the kernel a POSIX_FADV_<advice> hint for `fd`, where supported."""
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, getattr(os, f'POSIX_FADV_{advice}'))
+
+def _open_image(source_file, image_format):
+    """
+    Opens an image, first trying only the plugin for `image_format` so Pillow
+    does not probe every registered format. Falls back to full detection for
+    files whose extension does not match their contents.
+    """
+    if image_format:
+        try:
+            return Image.open(source_file, formats=[image_format])
+        except Image.UnidentifiedImageError:
+            source_file.seek(0)
+    return Image.open(source_file)
+
+def resize_image(source_path, output_path, source_size, image_format=None,
+                 use_gifsicle=False, use_oxipng=False, frame_workers=1):
     """
     Dispatches image processing to format-specific functions.
+    `source_size` is the size of the source file in bytes, as found by the scan,
+    and `image_format` the format expected from its extension, if known.
+    `frame_workers` is the number of threads a GIF's frames may be resized on.
     Returns the number of bytes saved.
     """
-    original_size = os.path.getsize(source_path)
-    
     try:
-        with Image.open(source_path) as img:
-            is_too_large = img.width > MAX_SIZE[0] or img.height > MAX_SIZE[1]
+        # Tell the kernel the source will be read front to back, so it can read
+        # ahead more aggressively.
+        with open(source_path, 'rb') as source_file:
+            _fadvise(source_file.fileno(), 'SEQUENTIAL')
+            with _open_image(source_file, image_format) as img:
+                is_too_large = img.width > MAX_SIZE[0] or img.height > MAX_SIZE[1]
             
-            # For GIFs, we always process them to potentially optimize them.
-            if img.format == 'GIF':
-                _resize_gif_with_optimization(img, source_path, output_path, use_gifsicle)
-            # For other images, we only process if they are too large.
-            elif is_too_large:
-                if img.format == 'JPEG':
-                    _resize_jpeg_with_exif(img, output_path)
+                # For GIFs, we always process them to potentially optimize them.
+                if img.format == 'GIF':
+                    _resize_gif_with_optimization(img, source_path, output_path, use_gifsicle,
+                                                  frame_workers)
+                # For other images, we only process if they are too large.
+                elif is_too_large:
+                    _RESIZERS.get(img.format, _resize_other_image)(img, output_path)
+                # PNGs that fit are still recompressed losslessly.
+                elif img.format == 'PNG':
+                    _optimize_png(img, source_path, output_path, source_size, use_oxipng)
+                # Otherwise, just copy the file contents; copyfile uses the
+                # kernel's in-place copy and skips copying metadata.
                 else:
-                    _resize_other_image(img, output_path)
-            # Otherwise, just copy the file.
-            else:
-                shutil.copy2(source_path, output_path)
+                    shutil.copyfile(source_path, output_path)
 
-        resized_size = os.path.getsize(output_path)
-        bytes_saved = original_size - resized_size
+            # Neither file is needed again; keep them from crowding the page cache.
+            _fadvise(source_file.fileno(), 'DONTNEED')
+
+        with open(output_path, 'rb') as output_file:
+            resized_size = os.fstat(output_file.fileno()).st_size
+            _fadvise(output_file.fileno(), 'DONTNEED')
+        bytes_saved = source_size - resized_size
         return bytes_saved
 
     except (IOError, OSError, Image.UnidentifiedImageError, subprocess.CalledProcessError) as e:
@@ -57,6 +109,80 @@ def resize_image(source_path, output_path, use_gifsicle=False):
         return 0
 
 
+def _iter_images(root, exts):
+    """
+    Recursively yields (path, extension, size) for files under `root` whose
+    lowercased name ends with one of the extensions in the tuple `exts`.
+    Uses os.scandir so that file types come from the directory listing, and
+    sizes from the DirEntry's cached stat.
+    """
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _iter_images(entry.path, exts)
+                elif entry.is_file():
+                    # Most names are already lowercase, so skip lower() for them.
+                    name = entry.name if entry.name.islower() else entry.name.lower()
+                    if not name.endswith(exts):
+                        continue
+                    # A single file that cannot be stat'ed (e.g. removed since
+                    # the listing) must not end the scan of its directory.
+                    try:
+                        size = entry.stat().st_size
+                    except OSError as e:
+                        print(f"ERROR: Could not read file {entry.path}. Reason: {e}", file=sys.stderr)
+                        continue
+                    yield entry.path, name[name.rfind('.'):], size
+    except OSError:
+        return
+
+
+def _prefetch_worker(paths, slots):
+    """
+    Hints the kernel to read each of `paths` into the page cache, acquiring
+    one of `slots` before each file to limit how far ahead it runs.
+    """
+    for path in paths:
+        slots.acquire()
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            _fadvise(fd, 'WILLNEED')
+        finally:
+            os.close(fd)
+
+
+def _resize_worker(task):
+    """Pool entry point: unpacks a resize_image argument tuple."""
+    return resize_image(*task)
+
+
+def _unique_output_names(source_paths):
+    """
+    Returns an output file name for each of `source_paths`. All outputs share
+    one directory, so a file whose name was already used by an earlier file
+    is given a numbered name, e.g. 'photo-1.jpg', instead of overwriting it.
+    """
+    basenames = [os.path.basename(source_path) for source_path in source_paths]
+    taken = set(basenames)
+    used = set()
+    output_names = []
+    for basename in basenames:
+        if basename in used:
+            stem, ext = os.path.splitext(basename)
+            n = 1
+            while f'{stem}-{n}{ext}' in taken:
+                n += 1
+            basename = f'{stem}-{n}{ext}'
+            taken.add(basename)
+        used.add(basename)
+        output_names.append(basename)
+    return output_names
+
+
 def process_directory(input_dir, test_mode=False):
     """
     Recursively traverses the input directory, finds images, and resizes them.
@@ -75,8 +201,17 @@ def process_directory(input_dir, test_mode=False):
         print("WARNING: 'gifsicle' not found. GIFs will be resized but not optimally compressed.")
         print("         For smaller GIFs, please install gifsicle (e.g., 'sudo apt-get install gifsicle')")
 
+    # oxipng compresses PNGs better than Pillow, but is optional.
+    use_oxipng = is_tool_installed('oxipng')
+
+    # Pillow-SIMD is a drop-in fork of Pillow with SIMD-accelerated resampling.
+    if not is_pillow_simd():
+        print("NOTE: Pillow-SIMD not found. Images will be resized with the slower stock Pillow.")
+        print("      For faster resizing, install it in place of Pillow")
+        print("      (e.g., 'pip uninstall pillow && CC=\"cc -mavx2\" pip install pillow-simd')")
 
-    supported_extensions = ('.jpg', '.jpeg', '.png', '.gif')
+
+    supported_extensions = tuple(EXTENSION_FORMATS)
     
     # Pre-scan to build the list of files to process
     files_to_process = []
@@ -84,36 +219,65 @@ def process_directory(input_dir, test_mode=False):
         print("Test mode enabled: will process up to 2 files per extension.")
         test_counts = {ext: 0 for ext in supported_extensions}
         test_limit = 2
-        for root, _, files in os.walk(input_dir):
-            for filename in files:
-                file_ext = os.path.splitext(filename)[1].lower()
-                if file_ext in supported_extensions:
-                    if test_counts.get(file_ext, 0) < test_limit:
-                        files_to_process.append(os.path.join(root, filename))
-                        test_counts[file_ext] += 1
-            # Optimization: if all limits are reached, stop walking
-            if all(count >= test_limit for count in test_counts.values()):
-                break
+        for source_path, file_ext, source_size in _iter_images(input_dir, supported_extensions):
+            if test_counts[file_ext] < test_limit:
+                files_to_process.append((source_path, file_ext, source_size))
+                test_counts[file_ext] += 1
+                # Optimization: if all limits are reached, stop walking
+                if all(count >= test_limit for count in test_counts.values()):
+                    break
     else:
-        for root, _, files in os.walk(input_dir):
-            for filename in files:
-                file_ext = os.path.splitext(filename)[1].lower()
-                if file_ext in supported_extensions:
-                    files_to_process.append(os.path.join(root, filename))
+        files_to_process = list(_iter_images(input_dir, supported_extensions))
+
+    # Files are independent, so they are resized in parallel, one per core.
+    workers = cpu_count()
+    chunksize = 8
+    # GIF frames may be resized on threads, but only on the cores the pool
+    # leaves idle; with at least one file per core, each GIF gets one thread.
+    frame_workers = max(1, workers - len(files_to_process) + 1)
+    output_names = _unique_output_names([source_path for source_path, _, _ in files_to_process])
+    tasks = [
+        (source_path, os.path.join(output_dir, output_name), source_size,
+         EXTENSION_FORMATS[file_ext], use_gifsicle, use_oxipng, frame_workers)
+        for (source_path, file_ext, source_size), output_name
+        in zip(files_to_process, output_names)
+    ]
+
+    # A background thread asks the kernel to start reading upcoming files, so
+    # disk reads overlap with resizing. It stays a few files ahead of the
+    # chunks held by the workers, taking a slot per file that is released as
+    # each file completes.
+    prefetch_slots = threading.Semaphore(workers * (chunksize + 4))
 
-    # Main processing loop is now unified
     total_bytes_saved = 0
-    with tqdm(total=len(files_to_process), desc="Resizing images", unit="file") as pbar:
-        for source_path in files_to_process:
-            filename = os.path.basename(source_path)
-            output_path = os.path.join(output_dir, filename)
-            
-            bytes_saved = resize_image(source_path, output_path, use_gifsicle)
+    # The progress bar is redrawn every 32 files or quarter second, rather than
+    # for every file, so it does not slow down the main loop.
+    pending_updates = 0
+    last_update = time.monotonic()
+    with tqdm(total=len(tasks), desc="Resizing images", unit="file") as pbar, \
+            Pool(workers) as pool:
+        # Started only once the pool has forked, so no worker inherits it.
+        if hasattr(os, 'posix_fadvise'):
+            threading.Thread(
+                target=_prefetch_worker,
+                args=([source_path for source_path, _, _ in files_to_process], prefetch_slots),
+                daemon=True
+            ).start()
+        for bytes_saved in pool.imap_unordered(_resize_worker, tasks, chunksize=chunksize):
+            prefetch_slots.release()
             if bytes_saved > 0:
                 total_bytes_saved += bytes_saved
-            
-            pbar.update(1)
-            pbar.set_postfix_str(f"Saved: {human_readable_size(total_bytes_saved)}")
+
+            pending_updates += 1
+            now = time.monotonic()
+            if pending_updates >= 32 or now - last_update >= 0.25:
+                pbar.set_postfix_str(f"Saved: {human_readable_size(total_bytes_saved)}", refresh=False)
+                pbar.update(pending_updates)
+                pending_updates = 0
+                last_update = now
+
+        pbar.set_postfix_str(f"Saved: {human_readable_size(total_bytes_saved)}", refresh=False)
+        pbar.update(pending_updates)
 
     print(f"\nTotal space saved: {human_readable_size(total_bytes_saved)}")
 
@@ -149,19 +313,52 @@ def main():
 
 # --- Image Processing Helper Functions ---
 
-def _resize_gif_with_optimization(img, source_path, output_path, use_gifsicle):
-    """Helper to resize and optimize a GIF."""
+def _quality_thumbnail(img, max_size):
+    """
+    Shrinks `img` to fit within `max_size` like `Image.thumbnail`, returning the
+    result. For large downscales, a cheap BILINEAR pass first brings the image
+    to about 1.25x the target size so LANCZOS only runs on the smaller image.
+    """
+    ratio = max(img.width / max_size[0], img.height / max_size[1])
+    if ratio > 3.0:
+        intermediate = (max(1, int(img.width / ratio * 1.25)), max(1, int(img.height / ratio * 1.25)))
+        img = img.resize(intermediate, Image.Resampling.BILINEAR)
+    img.thumbnail(max_size, Image.Resampling.LANCZOS)
+    return img
+
+def _resize_gif_with_optimization(img, source_path, output_path, use_gifsicle,
+                                  frame_workers=1):
+    """Helper to resize and optimize a GIF, using up to `frame_workers` threads."""
     needs_resize = img.width > MAX_SIZE[0] or img.height > MAX_SIZE[1]
     
     # Fallback if gifsicle is not available
     if not use_gifsicle:
-        frames = []
-        for frame in ImageSequence.Iterator(img):
-            frame_copy = frame.copy()
-            if needs_resize:
-                frame_copy.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
-            frames.append(frame_copy)
-        
+        def resized_frames():
+            if not needs_resize:
+                for frame in ImageSequence.Iterator(img):
+                    yield frame.copy()
+                return
+
+            if frame_workers <= 1:
+                for frame in ImageSequence.Iterator(img):
+                    yield _quality_thumbnail(frame.copy(), MAX_SIZE)
+                return
+
+            # Frames are resized on a thread pool, since Pillow releases the GIL
+            # while resampling. Only a bounded window of frames is queued at
+            # once, and they are yielded in their original order.
+            with ThreadPoolExecutor(max_workers=frame_workers) as executor:
+                pending = deque()
+                for frame in ImageSequence.Iterator(img):
+                    pending.append(executor.submit(_quality_thumbnail, frame.copy(), MAX_SIZE))
+                    if len(pending) >= 2 * frame_workers:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+
+        # Every frame is read before saving, so that `img` has reached the last
+        # frame when its loop and duration are read, whatever the thread count.
+        frames = list(resized_frames())
         if frames:
             frames[0].save(
                 output_path,
@@ -173,58 +370,105 @@ def _resize_gif_with_optimization(img, source_path, output_path, use_gifsicle):
             )
         return
 
-    # Gifsicle path
-    temp_path = None
-    input_for_gifsicle = source_path
-
-    if needs_resize:
-        # Resize with Pillow first into a temporary file
-        frames = []
-        for frame in ImageSequence.Iterator(img):
-            frame_copy = frame.copy()
-            frame_copy.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
-            frames.append(frame_copy)
-        
-        if frames:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".gif") as temp_f:
-                temp_path = temp_f.name
-            
-            frames[0].save(
-                temp_path,
-                save_all=True,
-                append_images=frames[1:],
-                loop=img.info.get('loop', 0),
-                duration=img.info.get('duration', 100),
-                format='GIF'
-            )
-            input_for_gifsicle = temp_path
-    
-    # Optimize with gifsicle
+    # Gifsicle resizes and optimizes in a single native pass, so Pillow is not
+    # needed at all. --resize-fit never enlarges, so small GIFs keep their size.
     subprocess.run(
-        ['gifsicle', '-O3', '--lossy=80', input_for_gifsicle, '-o', output_path],
+        ['gifsicle', '--resize-fit', f'{MAX_SIZE[0]}x{MAX_SIZE[1]}', '-O3', '--lossy=80',
+         source_path, '-o', output_path],
         check=True,
         capture_output=True
     )
 
-    if temp_path and os.path.exists(temp_path):
-        os.remove(temp_path)
+@functools.lru_cache(maxsize=None)
+def _reference_qtables(quality):
+    """Returns the quantization tables Pillow uses when saving a JPEG at `quality`."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(buffer, 'JPEG', quality=quality)
+    buffer.seek(0)
+    with Image.open(buffer) as reference:
+        return reference.quantization
 
 def _resize_jpeg_with_exif(img, output_path):
     """Helper to resize a JPEG and preserve EXIF."""
+    # Encode at JPEG_QUALITY with 4:2:0 chroma subsampling, unless the source
+    # was compressed more coarsely than that: then its own quantization tables
+    # and subsampling are reused, as a finer encode would only add bytes.
+    source_qtables = img.quantization
+    if source_qtables and sum(source_qtables[0]) > sum(_reference_qtables(JPEG_QUALITY)[0]):
+        save_options = {'qtables': source_qtables, 'subsampling': JpegImagePlugin.get_sampling(img)}
+    else:
+        save_options = {'quality': JPEG_QUALITY, 'subsampling': '4:2:0'}
+    # Optimized Huffman tables and progressive scans make smaller files at the
+    # same quality.
+    save_options.update(optimize=True, progressive=True)
+
+    # Let libjpeg decode at 1/2, 1/4 or 1/8 scale while staying at least
+    # MAX_SIZE, instead of decoding the full resolution. This is only done
+    # here, once the original size has been found to be too large.
+    img.draft('RGB', MAX_SIZE)
     exif_data = img.info.get('exif')
-    img_copy = img.copy()
-    img_copy.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
-    
     if exif_data:
-        img_copy.save(output_path, 'JPEG', exif=exif_data)
-    else:
-        img_copy.save(output_path, 'JPEG')
+        save_options['exif'] = exif_data
+
+    # The source image is not used afterwards, so it is resized without a copy.
+    # This leaves the image as is if draft() already decoded it to MAX_SIZE.
+    img = _quality_thumbnail(img, MAX_SIZE)
+    img.save(output_path, 'JPEG', **save_options)
+
+def _png_chunk_types(path):
+    """Returns the set of chunk types in the PNG at `path`, reading only chunk headers."""
+    chunk_types = set()
+    with open(path, 'rb') as png_file:
+        png_file.seek(8)  # Skip the PNG signature
+        while True:
+            header = png_file.read(8)
+            if len(header) < 8:
+                break
+            chunk_types.add(header[4:])
+            if header[4:] == b'IEND':
+                break
+            # Skip the chunk data and its CRC.
+            png_file.seek(int.from_bytes(header[:4], 'big') + 4, os.SEEK_CUR)
+    return chunk_types
+
+def _optimize_png(img, source_path, output_path, source_size, use_oxipng):
+    """Helper to losslessly recompress a PNG that needs no resizing."""
+    if use_oxipng:
+        subprocess.run(
+            ['oxipng', '-o', '2', '--strip', 'safe', '--out', output_path, source_path],
+            check=True,
+            capture_output=True
+        )
+        return
+
+    # Pillow only re-saves single-frame, 8-bit PNGs without loss: it writes just
+    # the first frame of an APNG, reads 16-bit channels as 8-bit and drops most
+    # metadata chunks. Copy anything else unchanged.
+    rawmode = img.tile[0][3] if len(img.tile) == 1 else None
+    if (getattr(img, 'n_frames', 1) > 1 or img.mode not in PNG_OPTIMIZE_MODES
+            or rawmode != img.mode or not _png_chunk_types(source_path) <= PNG_OPTIMIZE_CHUNKS):
+        shutil.copyfile(source_path, output_path)
+        return
+
+    text_chunks = PngImagePlugin.PngInfo()
+    for key, value in img.text.items():
+        text_chunks.add_text(key, value)
+    img.save(output_path, 'PNG', optimize=True, pnginfo=text_chunks)
+    # Pillow cannot always beat an already well-compressed PNG; keep the original then.
+    if os.path.getsize(output_path) >= source_size:
+        shutil.copyfile(source_path, output_path)
 
 def _resize_other_image(img, output_path):
     """Helper to resize a non-GIF, non-JPEG image."""
-    img_copy = img.copy()
-    img_copy.thumbnail(MAX_SIZE, Image.Resampling.LANCZOS)
-    img_copy.save(output_path, img.format)
+    # Keep the format, since a resized image no longer carries it.
+    img_format = img.format
+    img = _quality_thumbnail(img, MAX_SIZE)
+    img.save(output_path, img_format)
+
+# Format-specific resize helpers for non-GIF images; others use _resize_other_image.
+_RESIZERS = {
+    'JPEG': _resize_jpeg_with_exif,
+}
 
 
 if __name__ == '__main__':